@@ -1,3 +1,4 @@
+import struct
 import numpy as np
 from tf import transformations
 import geometry_msgs.msg as geometry_msgs
@@ -143,6 +144,27 @@ def numpy_quat_pair_to_pose(np_translation, np_quaternion):
     return geometry_msgs.Pose(position=position, orientation=orientation)
 
 
+_HEADER_STAMP = struct.Struct('<II')  # secs, nsecs after the uint32 seq of a serialized Header
+
+
+def definition_starts_with_header(definition):
+    '''Return True if the first field of a full message definition is a std_msgs/Header
+        The definition is the text rosbag and connection headers carry as message_definition
+    '''
+    for line in definition.splitlines():
+        line = line.split('#')[0].strip()
+        if line:
+            return line.split()[0] in ('Header', 'std_msgs/Header')
+    return False
+
+
+def unpack_header_stamp(data):
+    '''Return (secs, nsecs) of the header stamp of a serialized message without deserializing it
+        Only valid for messages whose definition starts with a Header
+    '''
+    return _HEADER_STAMP.unpack_from(data, 4)
+
+
 def make_header(frame='/body', stamp=None):
     if stamp is None:
         try:
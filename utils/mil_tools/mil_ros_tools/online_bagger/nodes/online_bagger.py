@@ -8,7 +8,15 @@ import os
 import resource
 from collections import deque
 import itertools
+import array
+import bisect
 import datetime
+import logging
+import threading
+import multiprocessing
+import Queue
+import signal
+from mil_ros_tools import definition_starts_with_header, unpack_header_stamp
 from mil_ros_tools.srv import BaggerCommands
 
 """
@@ -26,6 +34,198 @@ For example:
             Provide 0.0, or 0 to bag everything
 """
 
+class _MsgType(object):
+
+    """
+    Stands in for a message class when writing serialized messages to a bag,
+    rosbag only needs the type's md5sum and full text for the topic's connection record.
+    """
+
+    __slots__ = ('_type', '_md5sum', '_full_text')
+
+    def __init__(self, msg_type, md5sum, full_text):
+        self._type = msg_type
+        self._md5sum = md5sum
+        self._full_text = full_text
+
+
+def _close_bag(bag):
+
+    """
+    Close a bag and write its index, return the error message if that failed
+    """
+
+    try:
+        bag.close()
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def _bag_writer(write_q, done_q, compression, chunk_threshold):
+
+    """
+    Main loop of the writer process, writes serialized messages from write_q to a bag.
+
+    Entries of write_q are:
+    ('open', path) opens a new bag
+    ('topic', topic, msg_type, md5sum, full_text) describes the messages of a topic
+    ('msg', topic, nsecs, data) is a serialized message and its time stamp in nanoseconds
+    ('close',) closes the bag and reports (path, error) on done_q
+    None closes any open bag and stops the process
+
+    The process also stops once its parent has exited without sending None.
+    """
+
+    # forked after init_node, so rospy's handler is inherited. Ctrl-C signals the whole process
+    # group, the parent's shutdown sends None once the dump in progress is queued.
+    # SIGTERM keeps its default so multiprocessing and roslaunch can still stop the writer
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    parent = os.getppid()
+    bag = None
+    path = None
+    error = None
+    types = {}
+
+    while True:
+        try:
+            item = write_q.get(timeout=1.0)
+        except Queue.Empty:
+            if os.getppid() != parent:
+                break  # parent was killed, nothing will be queued anymore
+            continue
+        if item is None:
+            break
+
+        kind = item[0]
+        if kind == 'msg':
+            if bag is not None:
+                _, topic, nsecs, data = item
+                msg_type = types[topic]
+                try:
+                    bag.write(topic, (msg_type._type, data, msg_type._md5sum, msg_type),
+                              t=rospy.Time(nsecs=nsecs), raw=True)
+                except Exception as e:
+                    # drop the rest of this dump but keep the process alive for the next one
+                    error = str(e)
+                    _close_bag(bag)
+                    bag = None
+
+        elif kind == 'topic':
+            types[item[1]] = _MsgType(*item[2:])
+
+        elif kind == 'open':
+            if bag is not None:
+                # the previous dump was never closed, finish its index before replacing it
+                done_q.put((path, _close_bag(bag) or 'Dump was not completed'))
+            path = item[1]
+            error = None
+            try:
+                bag = rosbag.Bag(path, 'w', compression=compression,
+                                 chunk_threshold=chunk_threshold)
+            except Exception as e:
+                bag = None
+                error = str(e)
+
+        elif kind == 'close':
+            if bag is not None:
+                error = _close_bag(bag)
+                bag = None
+            done_q.put((path, error))
+
+    if bag is not None:
+        done_q.put((path, _close_bag(bag)))
+
+
+class _TopicCB(object):
+
+    """
+    Streaming callback for a single topic, keeps streaming during bagging process
+    also pops off msgs from dequeue if stream size is greater than specified stream_time,
+    topics with a fixed capacity deque evict the oldest message on append instead.
+
+    Topics are subscribed as rospy.AnyMsg so only the serialized bytes are buffered.
+    The message type is read from the connection header of the first message, the header
+    stamp is unpacked straight from the bytes when the type starts with a Header.
+
+    The topic's deque, time stamp array, retention limit and lock are captured on
+    construction so handling a message needs no dictionary lookups. A dump replaces
+    the deque and array while holding the lock, so they are only read under it.
+
+    Evicted time stamps are not deleted from the front of the array one by one, that is a
+    memmove of the whole array. ts[head:] are the stamps of the messages in dq, the
+    evicted prefix is compacted once it is larger than the live part.
+    """
+
+    __slots__ = ('dq', 'ts', 'head', 'ret', 'lock', 'parent', 'name', 'stamped')
+
+    def __init__(self, parent, name):
+        self.dq = parent._msgs[name]
+        self.ts = parent._ts[name]
+        self.head = 0  # index in ts of the oldest message in dq
+        self.ret = parent._retention_ns[name]
+        self.lock = parent._locks[name]
+        self.parent = parent
+        self.name = name
+        self.stamped = None  # unknown until the first message arrives
+
+    def _read_type(self, msg):
+        header = msg._connection_header
+        # message_definition is optional in a TCPROS connection header
+        definition = header.get('message_definition', '')
+        if not definition:
+            rospy.logwarn('%s has no message definition, using receive time as stamp', self.name)
+        self.parent._types[self.name] = (header['type'], header['md5sum'], definition)
+        self.stamped = definition_starts_with_header(definition)
+
+    def __call__(self, msg):
+        parent = self.parent
+        parent.iteration_count = parent.iteration_count + 1
+        if self.stamped is None:
+            self._read_type(msg)
+
+        data = msg._buff
+        if self.stamped:
+            secs, nsecs = unpack_header_stamp(data)
+            now = secs * 1000000000 + nsecs
+        else:
+            now = rospy.get_rostime().to_nsec()
+
+        with self.lock:
+            dq = self.dq
+            ts = self.ts
+            dq.append(data)
+            ts.append(now)
+
+            # verify streaming is popping off and recording topics
+            if parent._debug and parent.iteration_count % 100 == 0:
+                rospy.logdebug('time_difference: %s', (ts[-1] - ts[self.head]) / 1e9)
+                rospy.logdebug('topic: %s', self.name)
+                rospy.logdebug('topic type: %s', parent._types[self.name][0])
+                rospy.logdebug('number of topic messages: %s', len(dq))
+
+            head = self.head
+            if dq.maxlen is not None:
+                # once full the append dropped the oldest message, keep ts aligned with dq
+                k = len(ts) - len(dq)
+            else:
+                # common case is that nothing needs evicting, so check the oldest message once
+                cutoff = ts[-1] - self.ret
+                if ts[head] >= cutoff:
+                    return
+
+                # evict everything older than the cutoff in one pass, also catches up after a stall
+                k = bisect.bisect_left(ts, cutoff, head)
+                for _ in xrange(k - head):
+                    dq.popleft()
+
+            if k > len(ts) // 2:
+                del ts[:k]
+                k = 0
+            self.head = k
+
+
 class OnlineBagger(object):
 
     def __init__(self):
@@ -35,19 +235,35 @@ class OnlineBagger(object):
         Subscribe to set of topics defined by the yaml file in directory
         Stream topics up to a given stream time, dump oldest messages when limit is reached
         Set up service to bag n seconds of data default to all of available data
+        Start writer process that writes dumped messages to the bag outside of this interpreter
         """
 
         self.successful_subscription_count = 0  # successful subscriptions
         self.iteration_count = 0  # number of iterations
-        self.streaming = True
+        # checked once so the callbacks skip building debug output when it would be discarded
+        self._debug = logging.getLogger('rosout').isEnabledFor(logging.DEBUG)
         self.get_params()
         self.make_dicts()
 
+        self._bag_open = False  # True while the writer process is writing a dump
+        self._bag_lock = threading.Lock()  # service calls run in parallel threads, guards _bag_open
+        # bounded so a slow disk blocks the dump (service thread), never the topic callbacks
+        self._write_q = multiprocessing.Queue(maxsize=self.write_queue_size)
+        self._done_q = multiprocessing.Queue()
+        self._writer = multiprocessing.Process(target=_bag_writer,
+                                               args=(self._write_q, self._done_q,
+                                                     self.compression, self.chunk_threshold))
+        self._writer.daemon = True
+        self._writer.start()
+        rospy.on_shutdown(self.stop_writer)
+
         self.bagging_service = rospy.Service('/online_bagger/dump', BaggerCommands,
                                              self.start_bagging)
 
-        self.subscribe_loop()
-        rospy.loginfo('subscriber list: %s', self.subscriber_list)
+        # subscribe without blocking, re subscribe to failed topics if available later
+        self._all_subscribed = False
+        self._sub_ticks = 0
+        self._sub_timer = rospy.Timer(rospy.Duration(0.1), self._sub_tick)
 
     def get_params(self):
 
@@ -58,14 +274,26 @@ class OnlineBagger(object):
         self.subscriber_list = rospy.get_param('/online_bagger/topics')
         self.dir = rospy.get_param('/online_bagger/bag_package_path', default=os.environ['HOME'])
         self.stream_time = rospy.get_param('/online_bagger/stream_time', default=30)  # seconds
+        # 'none', 'bz2' or 'lz4', chunks are compressed by the writer process
+        self.compression = rospy.get_param('/online_bagger/compression',
+                                           default=rosbag.Compression.NONE)
+        # bytes buffered per bag chunk, larger chunks mean fewer chunk and index records to write
+        self.chunk_threshold = rospy.get_param('/online_bagger/chunk_threshold',
+                                               default=16 * 1024 * 1024)
+        self.write_queue_size = rospy.get_param('/online_bagger/write_queue_size', default=1024)
+        # large receive buffers and queues keep high bandwidth topics (images, clouds) from dropping
+        self.subscriber_options = rospy.get_param('/online_bagger/subscriber_options',
+                                                  default={'queue_size': 50, 'buff_size': 2**24,
+                                                           'tcp_nodelay': True})
 
         rospy.loginfo('subscriber list: %s', self.subscriber_list)
         rospy.loginfo('stream_time: %s seconds', self.stream_time)
+        rospy.loginfo('compression: %s', self.compression)
 
     def make_dicts(self):
 
         """
-        Make dictionary with sliceable deques() that will be filled with messages and time stamps.
+        Make dictionaries of deques() and arrays that will be filled with messages and time stamps.
 
         Subscriber list contains all of the topics, their stream time and their subscription status:
         A True status for a given topic corresponds to a successful subscription
@@ -73,62 +301,84 @@ class OnlineBagger(object):
 
         Stream time for an individual topic is specified in seconds.
 
+        An optional third element in the yaml file is a dictionary of rospy.Subscriber
+        transport options (queue_size, buff_size, tcp_nodelay) overriding the defaults for
+        that topic, it is moved into self._sub_options before the status is appended.
+        It may also hold expected_hz, the topic's publishing rate, which sizes the topic's deque
+        as a fixed capacity ring buffer instead of trimming it by stream time.
+
         For Example:
         self.subscriber_list[0:1] = [['/odom', 300 ,False], ['/absodom', 300, True]]
 
         Indicates that '/odom' has not been subscribed to, but '/absodom' has been subscribed to
 
-        self.topic_messages is a dictionary of deques containing a list of tuples.
-        Dictionary Keys contain topic names
-        Each value for each topic contains a deque
-        Each deque contains a list of tuples
-        Each tuple contains a message and its associated time stamp
+        self._msgs and self._ts are parallel dictionaries keyed by topic name.
+        self._msgs contains a deque of serialized messages for each topic
+        self._ts contains an array of integer nanosecond time stamps for each topic
+        The (head + n)-th time stamp belongs to the n-th message of the same topic, where head
+        is the number of evicted stamps not yet compacted, kept by the topic's _TopicCB
 
         For example:
         '/odom' is  a potential topic name
-        self.topic_message['/odom']  is a deque
-        self.topic_message['/odom'][0]  is the oldest message available in the deque
-        and its time stamp if available. It is a tuple with each element: (time_stamp, msg)
-        self.topic_message['/odom'][0][0] is the time stamp for the oldest message
-        self.topic_message['/odom'][0][1] is the message associated with the oldest topic
+        self._msgs['/odom']  is a deque
+        self._msgs['/odom'][0]  is the oldest message available in the deque
+        self._ts['/odom'][head] is the time stamp for the oldest message
+        self._types['/odom'] is (type, md5sum, definition) once a message has arrived
         """
 
-        self.topic_messages = {}
-        self.topic_list = []
-
-        class SliceableDeque(deque):
-            def __getitem__(self, index):
-                if isinstance(index, slice):
-                    return type(self)(itertools.islice(self, index.start,
-                                                       index.stop, index.step))
-                return deque.__getitem__(self, index)
+        self._msgs = {}
+        self._ts = {}
+        self._types = {}
+        self._topic_cbs = {}  # subscriber callback of each subscribed topic
+        self._locks = {}  # guards each topic's deque and array between its callback and a dump
+        self._sub_options = {}  # keyword arguments for each topic's rospy.Subscriber
 
         for topic in self.subscriber_list:
             if len(topic) == 1:
                 topic.append(self.stream_time)
                 rospy.loginfo('no stream time provided, default used for: %s', topic)
-            self.topic_messages[topic[0]] = SliceableDeque(deque())
+            self._sub_options[topic[0]] = dict(self.subscriber_options)
+            if len(topic) > 2:
+                self._sub_options[topic[0]].update(topic.pop(2))
+
+            # ring buffer with some headroom over the expected number of messages in stream time
+            expected_hz = self._sub_options[topic[0]].pop('expected_hz', None)
+            capacity = int(topic[1] * expected_hz * 1.2) if expected_hz else None
+            if capacity is not None and capacity < 1:
+                rospy.logwarn('expected_hz %s of %s gives no buffer capacity, trimming by '
+                              'stream time instead', expected_hz, topic[0])
+                capacity = None
+
+            self._msgs[topic[0]] = deque(maxlen=capacity)
+            self._ts[topic[0]] = array.array('l')
+            self._locks[topic[0]] = threading.Lock()
             topic.append(False)
-            self.topic_list.append(topic[0])
+
+        # stream time of each topic in seconds and its retention limit in integer nanoseconds
+        self._stream_time = {t[0]: t[1] for t in self.subscriber_list}
+        self._retention_ns = {t: int(sec * 1e9) for t, sec in self._stream_time.items()}
 
         rospy.loginfo('topics status: %s', self.subscriber_list)
 
-    def subscribe_loop(self):
+    def _sub_tick(self, event):
 
         """
         Continue to subscribe until at least one topic is successful,
-        then break out of loop and be called in the callback function to prevent the function
-        from locking up.
+        then stop this timer, remaining topics are retried by the resubscribe timer.
         """
 
-        i = 0
-        # if self.successful_subscription_count == 0 and not rospy.is_shutdown():
-        while self.successful_subscription_count == 0 and not rospy.is_shutdown():
-            self.subscribe()
-            rospy.sleep(0.1)
-            i = i + 1
-            if i % 1000 == 0:
-                rospy.logdebug('still subscribing!')
+        if self.successful_subscription_count > 0:
+            return
+
+        self.subscribe()
+        self._sub_ticks = self._sub_ticks + 1
+        if self._sub_ticks % 1000 == 0:
+            rospy.logdebug('still subscribing!')
+
+        if self.successful_subscription_count > 0:
+            self._sub_timer.shutdown()
+            rospy.loginfo('subscriber list: %s', self.subscriber_list)
+            self.resubscribe_timer = rospy.Timer(rospy.Duration(2.0), self._resubscribe_cb)
 
     def subscribe(self):
 
@@ -148,32 +398,48 @@ class OnlineBagger(object):
 
         for topic in self.subscriber_list:
             if not topic[2]:
-                msg_class = rostopic.get_topic_class(topic[0])
-                if msg_class[1] is not None:
-                    self.successful_subscription_count = self.successful_subscription_count + 1
-                    rospy.Subscriber(topic[0], msg_class[0],
-                                     lambda msg, _topic=topic[0]: self.bagger_callback(msg, _topic))
-
-                    topic[2] = True  # successful subscription
-
-    def get_topic_duration(self, topic):
+                # runs in a timer callback, an exception here would stop all future retries
+                try:
+                    topic_type = rostopic.get_topic_type(topic[0])
+                    if topic_type[1] is None:
+                        continue
+                    # a dump may look up the callback as soon as the first message arrives
+                    self._topic_cbs[topic[0]] = _TopicCB(self, topic[0])
+                    rospy.Subscriber(topic[0], rospy.AnyMsg, self._topic_cbs[topic[0]],
+                                     **self._sub_options[topic[0]])
+                except Exception as e:
+                    self._topic_cbs.pop(topic[0], None)
+                    rospy.logerr('Failed to subscribe to %s, will retry: %s', topic[0], e)
+                    continue
+
+                self.successful_subscription_count = self.successful_subscription_count + 1
+                topic[2] = True  # successful subscription
+
+    def _resubscribe_cb(self, event):
 
         """
-        Return current time duration of topic
+        Periodically retry topics that failed subscription, stops once all topics are subscribed
         """
 
-        return self.topic_messages[topic][-1][0] - self.topic_messages[topic][0][0]
+        if self._all_subscribed:
+            return
+
+        if self.successful_subscription_count < len(self.subscriber_list):
+            self.subscribe()
+
+        if self.successful_subscription_count == len(self.subscriber_list):
+            self._all_subscribed = True
+            self.resubscribe_timer.shutdown()
+            rospy.loginfo('all topics subscribed: %s', self.subscriber_list)
 
-    def get_header_time(self, msg):
+    def get_topic_duration(self, topic):
 
         """
-        Retrieve header time if available
+        Return current time duration of topic
         """
 
-        if hasattr(msg, 'header'):
-            return msg.header.stamp
-        else:
-            return rospy.get_rostime()
+        ts = self._ts[topic]
+        return rospy.Duration(nsecs=ts[-1] - ts[self._topic_cbs[topic].head])
 
     def get_time_index(self, topic, requested_seconds):
 
@@ -188,10 +454,12 @@ class OnlineBagger(object):
         Seconds is of a number type (not a rospy.Time type) (ie. int, float)
         """
 
-        topic_duration = self.get_topic_duration(topic).to_sec()
+        ts = self._ts[topic]
+        head = self._topic_cbs[topic].head
+        topic_duration = (ts[-1] - ts[head]) / 1e9
 
-        ratio = requested_seconds / topic_duration
-        index = int(self.get_topic_message_count(topic) * (1 - min(ratio, 1)))
+        # index into the deque, ts is offset by the evicted stamps before head
+        index = bisect.bisect_left(ts, ts[-1] - int(requested_seconds * 1e9), head) - head
 
         self.bag_report = 'The requested %s seconds were bagged' % requested_seconds
 
@@ -200,48 +468,13 @@ class OnlineBagger(object):
             messages were bagged' %  (topic_duration, requested_seconds)
         return index
 
-    def bagger_callback(self, msg, topic):
-
-        """
-        Streaming callback function, stops streaming during bagging process
-        also pops off msgs from dequeue if stream size is greater than specified stream_time
-
-        Stream, callback function does nothing if streaming is not active
-        """
-
-        if not self.streaming:
-            return
-
-        self.iteration_count = self.iteration_count + 1
-        time = self.get_header_time(msg)
-
-        self.topic_messages[topic].append((time, msg))
-
-        time_diff = self.get_topic_duration(topic)
-
-        # verify streaming is popping off and recording topics
-        if self.iteration_count % 100 == 0:
-            rospy.logdebug('time_difference: %s', time_diff.to_sec())
-            rospy.logdebug('topic: %s', topic)
-            rospy.logdebug('topic type: %s', type(msg))
-            rospy.logdebug('number of topic messages: %s', self.get_topic_message_count(topic))
-
-        index = self.topic_list.index(topic)
-
-        while time_diff > rospy.Duration(self.subscriber_list[index][1]) and not rospy.is_shutdown():
-            self.topic_messages[topic].popleft()
-            time_diff = self.get_topic_duration(topic)
-
-        # re subscribe to failed topics if available later
-        self.subscribe()
-
     def get_topic_message_count(self, topic):
 
         """
         Return number of messages available in a topic
         """
 
-        return len(self.topic_messages[topic])
+        return len(self._msgs[topic])
 
     def get_total_message_count(self):
 
@@ -249,16 +482,12 @@ class OnlineBagger(object):
         Returns total number of messages across all topics
         """
 
-        total_message_count = 0
-        for topic in self.topic_messages.keys():
-            total_message_count = total_message_count + self.get_topic_message_count(topic)
-
-        return total_message_count
+        return sum(map(len, self._msgs.values()))
 
     def set_bag_directory(self,bag_name=''):
 
         """
-        Create ros bag save directory
+        Create ros bag save directory and set the path of the bag to write
         If no bag name is provided, the current date/time is used as default.
         """
 
@@ -275,7 +504,7 @@ class OnlineBagger(object):
         if not os.path.exists(directory):
             os.makedirs(directory)
 
-        self.bag = rosbag.Bag(os.path.join(directory, bag_name + '.bag'), 'w')
+        self.bag_path = os.path.join(directory, bag_name + '.bag')
 
     def set_bagger_status(self):
 
@@ -289,15 +518,28 @@ class OnlineBagger(object):
     def start_bagging(self, req):
 
         """
-        Dump all data in dictionary to bags, temporarily stops streaming
-        during the bagging process, resumes streaming when over.
+        Dump all data in dictionary to bags, streaming continues during the bagging process.
+        The bag directory is created in a separate thread while each topic's deque and
+        time stamp array are swapped for empty ones under its lock, then the serialized
+        messages are queued for the writer process. The reply is sent once the writer
+        has closed the bag, so a bag that failed to open or write is reported to the caller.
         """
 
-        self.streaming = False
-        self.set_bag_directory(req.bag_name)
+        if not self._writer.is_alive():
+            return self._writer_died()
+
+        with self._bag_lock:
+            if self._bag_open:
+                return 'Previous bag is still being written, try again once it is finished'
+            self._bag_open = True
+
+        self.bag_path = None
+        bag_opener = threading.Thread(target=self.set_bag_directory, args=(req.bag_name,))
+        bag_opener.start()
         self.set_bagger_status()
 
         requested_seconds = req.bag_time
+        snapshots = []
 
         for topic in self.subscriber_list:
             if topic[2] == False:
@@ -306,33 +548,114 @@ class OnlineBagger(object):
             topic = topic[0]
             rospy.loginfo('topic: %s', topic)
 
-            # if no number is provided or a zero is given, bag all messages
-            types = (0, 0.0, None)
-            if req.bag_time in types:
-                bag_index = 0
-                self.bag_report = 'All messages were bagged'
+            with self._locks[topic]:
+                dq = self._msgs[topic]
+                ts = self._ts[topic]
+                if not dq:
+                    continue
+
+                # if no number is provided or a zero is given, bag all messages
+                types = (0, 0.0, None)
+                if req.bag_time in types:
+                    bag_index = 0
+                    self.bag_report = 'All messages were bagged'
+
+                # get time index the normal way
+                else:
+                    bag_index = self.get_time_index(topic, requested_seconds)
+
+                # callback continues on fresh buffers, the full ones are read after unlocking
+                msgs, stamps = dq, ts
+                cb = self._topic_cbs[topic]
+                head = cb.head
+                cb.dq = self._msgs[topic] = deque(maxlen=dq.maxlen)
+                cb.ts = self._ts[topic] = array.array('l')
+                cb.head = 0
+
+            snapshots.append((topic, bag_index, head, stamps, msgs))
+
+        bag_opener.join()
+        if self.bag_path is None:
+            self._bag_open = False
+            rospy.logerr('Failed to create bag %s, snapshot discarded', req.bag_name)
+            return 'Failed to create bag, no messages were bagged'
+
+        if not self._put(('open', self.bag_path)):
+            return self._writer_died()
+        for topic, bag_index, head, stamps, msgs in snapshots:
+            if not self._put(('topic', topic) + self._types[topic]):
+                return self._writer_died()
+
+            for t, data in itertools.izip(itertools.islice(stamps, head + bag_index, None),
+                                          itertools.islice(msgs, bag_index, None)):
+                if not self._put(('msg', topic, t, data)):
+                    return self._writer_died()
+
+        # tell the writer process this dump is complete
+        if not self._put(('close',)):
+            return self._writer_died()
+
+        error = self._wait_for_bag(self.bag_path)
+        if error is False:
+            return self._writer_died()
+        self._bag_open = False
+        if error is not None:
+            rospy.logerr('Failed to write bag %s: %s', self.bag_path, error)
+            return 'Failed to write bag %s: %s' % (self.bag_path, error)
+
+        rospy.loginfo('bagging finished! %s', self.bag_path)
+        rospy.loginfo('Bag Report: %s', self.bagger_status)
+        return self.bagger_status
 
-            # get time index the normal way
-            else:
-                bag_index = self.get_time_index(topic, requested_seconds)
+    def _put(self, item):
 
-            messages = 0  # message number in a given topic
-            for msgs in self.topic_messages[topic][bag_index:]:
-                messages = messages + 1
-                self.bag.write(topic, msgs[1], t=msgs[0])
-                if messages % 100 == 0:  # print every 100th topic, type and time
-                    rospy.loginfo('topic: %s, message type: %s, time: %s',
-                    topic, type(msgs[1]), type(msgs[0]))
+        """
+        Put an entry on the write queue, return False instead of blocking if the writer process died
+        """
 
-            # empty deque when done writing to bag
-            self.topic_messages[topic].clear()
+        while True:
+            try:
+                self._write_q.put(item, timeout=1.0)
+                return True
+            except Queue.Full:
+                if not self._writer.is_alive():
+                    return False
 
-        rospy.loginfo('Bag Report: %s', self.bagger_status)
-        self.bag.close()
-        rospy.loginfo('bagging finished!')
+    def _writer_died(self):
 
-        self.streaming = True
-        return self.bagger_status
+        """
+        Fail the current dump after the writer process exited, return the service status
+        """
+
+        self._bag_open = False
+        rospy.logerr('Bag writer process exited with code %s, dump aborted', self._writer.exitcode)
+        return 'Bag writer process is not running, dump aborted'
+
+    def _wait_for_bag(self, path):
+
+        """
+        Wait until the writer process has closed the bag at path
+        Return the writer's error message, None if the bag was written or False if the writer died
+        """
+
+        while True:
+            try:
+                done, error = self._done_q.get(timeout=1.0)
+            except Queue.Empty:
+                if not self._writer.is_alive():
+                    return False
+                continue
+            if done == path:
+                return error
+
+    def stop_writer(self):
+
+        """
+        Stop the writer process, waits for a dump in progress to be written and closed
+        """
+
+        if self._put(None):
+            self._writer.join()
 
 if __name__ == "__main__":
     rospy.init_node('online_bagger')
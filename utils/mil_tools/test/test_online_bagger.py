@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+import os
+import imp
+import struct
+import unittest
+
+# the node is a script, load it as a module to drive its topic callback directly
+online_bagger = imp.load_source('online_bagger', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'mil_ros_tools', 'online_bagger', 'nodes',
+    'online_bagger.py'))
+
+NSEC = 1000000000
+PERIOD = NSEC // 10  # 10 Hz
+
+
+class _Msg(object):
+    '''Serialized message with a Header as rospy.AnyMsg delivers it'''
+
+    _connection_header = {'type': 'geometry_msgs/PointStamped',
+                          'md5sum': 'c63aecb41bfdfd6b7e1fac37c7cbe7bf',
+                          'message_definition': 'Header header\ngeometry_msgs/Point point\n'}
+
+    def __init__(self, nsecs):
+        self._buff = struct.pack('<IIII3d', 0, nsecs // NSEC, nsecs % NSEC, 0, 0., 0., 0.)
+
+
+class TestTopicCB(unittest.TestCase):
+    def setUp(self):
+        '''Make a bagger with one topic trimmed by stream time and one fixed capacity topic'''
+        self.bagger = online_bagger.OnlineBagger.__new__(online_bagger.OnlineBagger)
+        self.bagger.iteration_count = 0
+        self.bagger._debug = False
+        self.bagger.stream_time = 1
+        self.bagger.subscriber_options = {}
+        self.bagger.subscriber_list = [['/trimmed', 1], ['/ring', 1, {'expected_hz': 4}]]
+        self.bagger.make_dicts()
+        for topic in ('/trimmed', '/ring'):
+            self.bagger._topic_cbs[topic] = online_bagger._TopicCB(self.bagger, topic)
+
+    def publish(self, topic, *stamps):
+        for nsecs in stamps:
+            self.bagger._topic_cbs[topic](_Msg(nsecs))
+
+    def assert_aligned(self, topic):
+        '''Check that ts[head:] are exactly the stamps of the messages in the deque'''
+        cb = self.bagger._topic_cbs[topic]
+        self.assertEqual(len(cb.ts) - cb.head, len(cb.dq))
+        stamps = [secs * NSEC + nsecs for secs, nsecs in
+                  (struct.unpack_from('<II', data, 4) for data in cb.dq)]
+        self.assertEqual(list(cb.ts[cb.head:]), stamps)
+
+    def test_steady_state_eviction(self):
+        '''Test that a steady stream keeps one stream time of messages'''
+        self.publish('/trimmed', *range(0, 11 * PERIOD, PERIOD))
+        self.assertEqual(len(self.bagger._msgs['/trimmed']), 11)
+        self.assert_aligned('/trimmed')
+
+        for i in range(11, 40):
+            self.publish('/trimmed', i * PERIOD)
+            self.assert_aligned('/trimmed')
+            cb = self.bagger._topic_cbs['/trimmed']
+            self.assertEqual(len(cb.dq), 11)
+            self.assertEqual(cb.ts[cb.head], (i - 10) * PERIOD)
+
+        # the last half second starts 5 messages into the deque
+        index = self.bagger.get_time_index('/trimmed', 0.5)
+        self.assertEqual(index, 5)
+        self.assertEqual(self.bagger._ts['/trimmed'][cb.head + index], 34 * PERIOD)
+
+    def test_catch_up_after_stall(self):
+        '''Test that a message after a gap evicts every message older than the stream time'''
+        self.publish('/trimmed', *range(0, 20 * PERIOD, PERIOD))
+        self.publish('/trimmed', 10 * NSEC)
+        self.assert_aligned('/trimmed')
+        self.assertEqual(list(self.bagger._ts['/trimmed']), [10 * NSEC])
+        self.assertEqual(self.bagger._topic_cbs['/trimmed'].head, 0)
+        self.assertEqual(self.bagger.get_time_index('/trimmed', 0.5), 0)
+
+    def test_full_ring_buffer(self):
+        '''Test that a full fixed capacity deque drops the stamp of the message it evicted'''
+        cb = self.bagger._topic_cbs['/ring']
+        self.assertEqual(cb.dq.maxlen, 4)
+        for i in range(20):
+            self.publish('/ring', i * PERIOD)
+            self.assert_aligned('/ring')
+            self.assertEqual(len(cb.dq), min(i + 1, 4))
+        self.assertEqual(list(cb.ts[cb.head:]), [16 * PERIOD, 17 * PERIOD, 18 * PERIOD, 19 * PERIOD])
+        self.assertEqual(self.bagger.get_time_index('/ring', 0.2), 1)
+        self.assertEqual(self.bagger.get_time_index('/ring', 10), 0)
+
+    def test_compaction_point(self):
+        '''Test that evicted stamps are compacted once they outnumber the live ones'''
+        cb = self.bagger._topic_cbs['/trimmed']
+
+        # 22 stamps, 11 evicted and 11 live, not compacted yet
+        self.publish('/trimmed', *range(0, 22 * PERIOD, PERIOD))
+        self.assert_aligned('/trimmed')
+        self.assertEqual(cb.head, 11)
+        self.assertEqual(len(cb.ts), 22)
+        self.assertEqual(self.bagger.get_time_index('/trimmed', 0.5), 5)
+
+        # the 12th evicted stamp is more than half of the array
+        self.publish('/trimmed', 22 * PERIOD)
+        self.assert_aligned('/trimmed')
+        self.assertEqual(cb.head, 0)
+        self.assertEqual(len(cb.ts), 11)
+        self.assertEqual(self.bagger.get_time_index('/trimmed', 0.5), 5)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestTopicCB)
+    unittest.TextTestRunner(verbosity=2).run(suite)
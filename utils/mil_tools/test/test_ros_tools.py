@@ -1,11 +1,13 @@
 #!/usr/bin/env python
 import unittest
+import struct
 import numpy as np
 from geometry_msgs.msg import Quaternion, Vector3, Pose2D
 from sensor_msgs.msg import Image
 from mil_ros_tools import make_image_msg, get_image_msg
 from mil_ros_tools import rosmsg_to_numpy, make_wrench_stamped
 from mil_ros_tools import thread_lock
+from mil_ros_tools import definition_starts_with_header, unpack_header_stamp
 from mil_ros_tools import skew_symmetric_cross, make_rotation, normalize
 
 
@@ -67,6 +69,24 @@ class TestROSTools(unittest.TestCase):
         cv_im = get_image_msg(im_msg)
         np.testing.assert_array_equal(im, cv_im)
 
+    def test_definition_starts_with_header(self):
+        '''Test finding a leading Header in full message definitions'''
+        commented = '# Camera image\n\n  # stamped by the driver\nHeader header  # acquisition time\nuint32 height\n'
+        self.assertTrue(definition_starts_with_header(commented))
+
+        qualified = 'std_msgs/Header header\nfloat64 data\n'
+        self.assertTrue(definition_starts_with_header(qualified))
+
+        unstamped = '# no header here\nfloat64 x\nHeader header\n'
+        self.assertFalse(definition_starts_with_header(unstamped))
+        self.assertFalse(definition_starts_with_header(''))
+
+    def test_unpack_header_stamp(self):
+        '''Test that the stamp is read from a serialized Header'''
+        seq, secs, nsecs = 42, 1507000000, 999999999
+        data = struct.pack('<III', seq, secs, nsecs) + struct.pack('<I', 4) + 'odom'
+        self.assertEqual(unpack_header_stamp(data), (secs, nsecs))
+
     def test_thread_lock(self):
         '''Test that the thread lock decorator correctly locks, in the correct order'''
         class FakeLock(object):